@@ -1,7 +1,7 @@
-import asyncio
 import sys
 
 import square
+import uvloop
 from hypercorn.asyncio import serve
 from hypercorn.config import Config
 
@@ -18,7 +18,7 @@ if __name__ == "__main__":  # codecov-skip
         dfh.logstreams.setup(cfg.loglevel)
         hypercorn_cfg = Config()
         hypercorn_cfg.bind = [f"{cfg.host}:{cfg.port}"]
-        asyncio.run(serve(dfh.api.make_app(), hypercorn_cfg))  # type: ignore
+        uvloop.run(serve(dfh.api.make_app(cfg), hypercorn_cfg))  # type: ignore
     except KeyboardInterrupt:
         print("User abort")
         sys.exit(1)
@@ -7,10 +7,11 @@ from pathlib import Path
 from typing import Tuple
 
 import httpx
+import itsdangerous
 from fastapi import Depends, FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.sessions import SessionMiddleware
@@ -39,8 +40,17 @@ def isLocalDev() -> bool:
 def make_httpclient() -> Tuple[httpx.AsyncClient, bool]:
     ca_path = os.environ.get("CA_FILE", None)
     verify = str(Path(ca_path).expanduser()) if ca_path else ""
+
+    # The client is shared by the entire app. Keep enough connections alive to
+    # avoid repeated TCP/TLS handshakes and multiplex requests via HTTP/2.
+    limits = httpx.Limits(
+        max_connections=200, max_keepalive_connections=50, keepalive_expiry=300
+    )
+    timeout = httpx.Timeout(connect=10.0, read=600.0, write=600.0, pool=60.0)
     try:
-        client = httpx.AsyncClient(verify=verify)
+        client = httpx.AsyncClient(
+            verify=verify, limits=limits, timeout=timeout, http2=True
+        )
     except OSError as err:
         logit.error("cannot create http client", {"reason": tuple(err.args)})
         return httpx.AsyncClient(), True
@@ -51,37 +61,44 @@ def make_httpclient() -> Tuple[httpx.AsyncClient, bool]:
 # Setup Server.
 # ----------------------------------------------------------------------
 def compile_server_config() -> Tuple[ServerConfig, bool]:
-    try:
-        client, err = make_httpclient()
-        assert not err
-
-        cfg = ServerConfig(
-            kubeconfig=Path(os.getenv("KUBECONFIG", "")),
-            kubecontext=os.getenv("KUBECONTEXT", ""),
-            managed_by=os.environ["DFH_MANAGED_BY"],
-            env_label=os.environ["DFH_ENV_LABEL"],
-            loglevel=os.getenv("DFH_LOGLEVEL", "info"),
-            host=os.getenv("DFH_HOST", "0.0.0.0"),
-            port=int(os.getenv("DFH_PORT", "5001")),
-            httpclient=client,
-        )
+    # Placeholder to return in case of errors. Use `model_construct` to skip
+    # the validation because we deliberately do not create an `AsyncClient`
+    # that nobody would ever close.
+    sentinel = ServerConfig.model_construct(
+        kubeconfig=Path(""),
+        kubecontext="",
+        managed_by="",
+        env_label="",
+        host="",
+        port=-1,
+        loglevel="",
+        httpclient=None,
+    )
 
-        return cfg, False
-    except (AssertionError, KeyError, ValueError) as e:
+    try:
+        managed_by = os.environ["DFH_MANAGED_BY"]
+        env_label = os.environ["DFH_ENV_LABEL"]
+        port = int(os.getenv("DFH_PORT", "5001"))
+    except (KeyError, ValueError) as e:
         logit.error("missing environment variables", {"names": tuple(e.args)})
-        return (
-            ServerConfig(
-                kubeconfig=Path(""),
-                kubecontext="",
-                managed_by="",
-                env_label="",
-                host="",
-                port=-1,
-                loglevel="",
-                httpclient=httpx.AsyncClient(),
-            ),
-            True,
-        )
+        return sentinel, True
+
+    # Only create the client once we know the configuration is valid.
+    client, err = make_httpclient()
+    if err:
+        return sentinel, True
+
+    cfg = ServerConfig(
+        kubeconfig=Path(os.getenv("KUBECONFIG", "")),
+        kubecontext=os.getenv("KUBECONTEXT", ""),
+        managed_by=managed_by,
+        env_label=env_label,
+        loglevel=os.getenv("DFH_LOGLEVEL", "info"),
+        host=os.getenv("DFH_HOST", "0.0.0.0"),
+        port=port,
+        httpclient=client,
+    )
+    return cfg, False
 
 
 @asynccontextmanager
@@ -89,26 +106,32 @@ async def lifespan(app: FastAPI):
     db = app.extra["db"]
     cfg: ServerConfig = app.extra["config"]
 
+    # Parse the Kubeconfig only once and share the resulting K8s client among
+    # all watchers.
+    k8scfg, err = dfh.watch.create_cluster_config(cfg.kubeconfig, cfg.kubecontext)
+    assert not err
+
     # Provide a single AsyncClient instance to the entire app. This will ensure
     # efficient reuse of sessions, certificates and other common configuration options.
-    async with cfg.httpclient:
-        # Create Database entry for Namespaces and a watcher.
-        tasks = []
-        for res in db.resources.values():
-            k8scfg, err = dfh.watch.create_cluster_config(
-                cfg.kubeconfig, cfg.kubecontext
-            )
-            assert not err
-            tasks.append(
-                asyncio.create_task(dfh.watch.setup_k8s_watch(cfg, k8scfg, db, res))
-            )
+    async with cfg.httpclient, k8scfg.client:
+        # Start a watcher task for every resource. Yielding to the event loop
+        # only lets the tasks start; they connect in the background and may
+        # still be doing so when we serve the first request.
+        tasks = [
+            asyncio.create_task(dfh.watch.setup_k8s_watch(cfg, k8scfg, db, res))
+            for res in db.resources.values()
+        ]
+        await asyncio.sleep(0)
 
         logit.info("server startup complete")
         yield
 
+        # Cancel all watchers at once and wait until they have all stopped.
         for task in tasks:
             task.cancel()
-            await task
+        for ret in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(ret, BaseException):
+                logit.error("watch aborted", {"reason": repr(ret)})
     logit.info("server shutdown complete")
 
 
@@ -131,12 +154,13 @@ class MyMiddleware(BaseHTTPMiddleware):
 
 async def validation_error_handler(
     _: Request, exc: RequestValidationError
-) -> JSONResponse:
-    print(exc.errors())
-    print(exc.body)
-    return JSONResponse(
-        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        content=jsonable_encoder({"detail": exc.errors(), "body": exc.body}),
+) -> ORJSONResponse:
+    # NOTE: the errors may contain objects like exceptions that the JSON log
+    # formatter cannot serialise. Encode them once for the log and response.
+    content = jsonable_encoder({"detail": exc.errors(), "body": exc.body})
+    logit.debug("validation error", content)
+    return ORJSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=content
     )
 
 
@@ -144,9 +168,16 @@ def fetch_secrets() -> Tuple[str, str, bool]:
     return "session-key-from-gsm", "token-key-from-gsm", False
 
 
-def make_app() -> ASGIApp:
-    """Return a fully configured FastAPI instance."""
-    cfg, err1 = compile_server_config()
+def make_app(cfg: ServerConfig | None = None) -> ASGIApp:
+    """Return a fully configured FastAPI instance.
+
+    Use the server configuration `cfg` if provided, otherwise compile it from
+    the environment variables.
+
+    """
+    err1 = False
+    if cfg is None:
+        cfg, err1 = compile_server_config()
     session_key, token_key, err2 = fetch_secrets()
     if err1 or err2:
         raise RuntimeError("could not meet preconditions to start server")
@@ -160,6 +191,7 @@ def make_app() -> ASGIApp:
         description="",
         version="0.1.0",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
         db={},
         docs_url="/demo/api/docs",
         openapi_url="/demo/api/v1/openapi.json",
@@ -167,6 +199,8 @@ def make_app() -> ASGIApp:
     )
     app.extra["session-key"] = session_key
     app.extra["api-token-key"] = token_key
+    app.extra["api-token-signer"] = itsdangerous.TimestampSigner(token_key)
+    app.extra["api-token-cache"] = {}
     app.extra["config"] = cfg
     app.extra["db"] = K8sDatabase()
     app.extra["spanner"] = database
@@ -191,13 +225,13 @@ def make_app() -> ASGIApp:
         runtimes.router,
         prefix="/demo/api/crt",
         tags=["Runtimes"],
-        dependencies=[Depends(auth.is_authenticated)],
+        dependencies=[Depends(deps.is_authenticated)],
     )
     app.include_router(
         uam.router,
         prefix="/demo/api/uam",
         tags=["User Access Management"],
-        dependencies=[Depends(auth.is_authenticated)],
+        dependencies=[Depends(deps.is_authenticated)],
     )
 
     # Basic routes *must* come last because one of them will serve the
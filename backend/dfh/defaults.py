@@ -1,8 +1,8 @@
-from typing import Dict, List, Tuple
+import functools
+from typing import Dict, FrozenSet, List, Tuple
 
 from square.dtypes import FiltersKind
 
-from dfh.models import K8sEnvVar
 
 # Convenience: these are the automatically injected environment variables based
 # on Pod labels.
@@ -13,10 +13,19 @@ RESERVED_FIELDREF_ENVS = (
     "POD_VERSION",
     "POD_IP",
 )
+RESERVED_FIELDREF_ENVS_SET: FrozenSet[str] = frozenset(RESERVED_FIELDREF_ENVS)
 
+# NOTE: the `lru_cache`d helpers below return the same object to every caller.
+# Treat their results as read-only and copy them before making any changes.
 
-def pod_fieldref_envs() -> List[K8sEnvVar]:
-    """Return default env vars that are sourced from Pod labels."""
+
+@functools.lru_cache(maxsize=1)
+def pod_fieldref_envs() -> Tuple[dict, ...]:
+    """Return default env vars that are sourced from Pod labels.
+
+    The env vars are plain dicts in the format of a K8s manifest.
+
+    """
     kv: List[Tuple[str, str]] = [
         ("POD_ID", "metadata.uid"),
         ("POD_NAME", "metadata.name"),
@@ -25,17 +34,14 @@ def pod_fieldref_envs() -> List[K8sEnvVar]:
         ("POD_IP", "status.podIP"),
     ]
 
-    env_vars = []
-    for name, value in kv:
-        env_vars.append(
-            K8sEnvVar(
-                name=name,
-                valueFrom=dict(fieldRef=dict(apiVersion="v1", fieldPath=value)),
-            )
-        )
-    return env_vars
+    env_vars = [
+        dict(name=name, valueFrom=dict(fieldRef=dict(apiVersion="v1", fieldPath=value)))
+        for name, value in kv
+    ]
+    return tuple(env_vars)
 
 
+@functools.lru_cache(maxsize=1)
 def pod_security_context() -> dict:
     """Return a generic pod security context."""
     ctx = dict(
@@ -66,7 +72,9 @@ def topology_spread(label_selectors: Dict[str, str]) -> List[dict]:
     return out
 
 
+@functools.lru_cache(maxsize=1)
 def square_filters() -> Dict[str, FiltersKind]:
+    """Return the Square filters for all resources DFH manages."""
     filters = {
         "Deployment": [
             {
@@ -1,9 +1,11 @@
-import copy
+import asyncio
+import functools
 import logging
 import uuid
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Tuple
 
+import orjson
 import pydantic
 import square
 import square.dtypes
@@ -25,20 +27,23 @@ from dfh.models import (
     GeneratedManifests,
     K8sDatabase,
     K8sDeployment,
-    K8sDestinationRule,
     K8sEnvVar,
     K8sMetadata,
     K8sProbe,
     K8sRequestLimit,
     K8sService,
-    K8sServicePort,
-    K8sVirtualService,
     ServerConfig,
     WatchedResource,
 )
 
 logit = logging.getLogger("app")
 
+# Use the fast libyaml based loader if PyYAML was built with it.
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # codecov-skip
+    from yaml import SafeLoader as YamlLoader  # type: ignore
+
 
 def k8s_resource_name(meta: AppMetadata, canary: bool):
     """Return K8s resource name.
@@ -74,24 +79,68 @@ def resource_labels(
     return labels
 
 
+@functools.lru_cache(maxsize=1)
+def _load_deployment_template() -> dict:
+    """Return the parsed deployment template.
+
+    The template never changes at runtime so we only read and parse it once.
+    Callers must not modify the returned dict and make a copy instead.
+
+    """
+    text = Path("support/deployment_template.yaml").read_text()
+    return yaml.load(text, Loader=YamlLoader)
+
+
+def _clone_manifest(manifest: Any) -> Any:
+    """Return a deep copy of the JSON compatible `manifest`.
+
+    This is several times faster than `copy.deepcopy` because K8s manifests
+    only contain plain JSON types.
+
+    """
+    return orjson.loads(orjson.dumps(manifest))
+
+
+def k8s_metadata(name: str, namespace: str, labels: Dict[str, str]) -> dict:
+    """Return the K8s metadata for a manifest.
+
+    The result is identical to a `K8sMetadata.model_dump()` but without the
+    overhead of Pydantic. The `labels` are copied and the caller is free to
+    modify them.
+
+    """
+    return {
+        "name": name,
+        "namespace": namespace,
+        "labels": dict(labels),
+        "annotations": {},
+        "creationTimestamp": None,
+    }
+
+
 def deployment_manifest(
-    cfg: ServerConfig, app: AppInfo, canary: bool, base: dict | None
+    cfg: ServerConfig,
+    app: AppInfo,
+    canary: bool,
+    base: dict | None,
+    labels: Dict[str, str] | None = None,
 ) -> dict:
     """Produce K8s deployment manifests for `app`.
 
     Set `base=None` to create a new deployment from scratch, or provide an
     existing one to upsert the changes into it.
 
+    The `labels` default to `resource_labels(cfg, app.metadata, canary)`.
+
     """
     # Load a template if the user did not provide a base manifest to upsert into.
     if base:
-        rawmanifest = copy.deepcopy(base)
+        rawmanifest = _clone_manifest(base)
     else:
-        rawmanifest = yaml.safe_load(
-            Path("support/deployment_template.yaml").read_text()
-        )
+        rawmanifest = _clone_manifest(_load_deployment_template())
 
-    labels = resource_labels(cfg, app.metadata, canary)
+    if labels is None:
+        labels = resource_labels(cfg, app.metadata, canary)
 
     # Parse the base manifest and fill out the Deployment info.
     manifest = K8sDeployment.model_validate(rawmanifest)
@@ -121,10 +170,12 @@ def deployment_manifest(
     container.livenessProbe = (
         dply.livenessProbe if dply.useLivenessProbe else K8sProbe()
     )
-    container.env = dply.envVars + dfh.defaults.pod_fieldref_envs()
+    container.env = dply.envVars
     container.securityContext = dfh.defaults.pod_security_context()
 
-    # Dump the model.
+    # Dump the model without its default values.
+    # NOTE: do not use `exclude_unset` here because it would drop nested
+    # `AppInfo` fields that were modified in place and never assigned.
     out = manifest.model_dump(exclude_defaults=True)
 
     # --- Post Processing ---
@@ -137,6 +188,13 @@ def deployment_manifest(
         else:
             container["resources"] = {}
 
+    # Append the reserved env vars to the application container. They are
+    # already in manifest format and need not go through Pydantic.
+    container = out["spec"]["template"]["spec"]["containers"][0]
+    container.setdefault("env", []).extend(
+        _clone_manifest(dfh.defaults.pod_fieldref_envs())
+    )
+
     out["spec"]["template"]["spec"]["topologySpreadConstraints"] = (
         dfh.defaults.topology_spread({"app": app.metadata.name})
     )
@@ -145,8 +203,17 @@ def deployment_manifest(
 
 
 def service_manifests(
-    cfg: ServerConfig, db: K8sDatabase, app_info: AppInfo
+    cfg: ServerConfig,
+    db: K8sDatabase,
+    app_info: AppInfo,
+    labels: Dict[bool, Dict[str, str]] | None = None,
 ) -> Dict[str, dict]:
+    """Produce the K8s service manifests for primary and canary.
+
+    The optional `labels` map the `is_canary` flag to the resource labels and
+    default to `resource_labels(cfg, app_info.metadata, is_canary)`.
+
+    """
     svc_info = app_info.primary
 
     out: Dict[str, dict] = {}
@@ -161,42 +228,55 @@ def service_manifests(
         if not svc_info.useService:
             continue
 
-        labels = resource_labels(cfg, app_info.metadata, is_canary)
+        if labels is None:
+            svc_labels = resource_labels(cfg, app_info.metadata, is_canary)
+        else:
+            svc_labels = labels[is_canary]
 
         k8s_name = k8s_resource_name(meta, is_canary)
-        svc = K8sService(apiVersion="v1", kind="Service")
-        svc.metadata = K8sMetadata(
-            name=k8s_name,
-            namespace=meta.namespace,
-            labels=labels,
-        )
-
-        port = K8sServicePort(
-            name="http2",
-            appProtocol="http2",
-            port=svc_info.service.port,
-            targetPort=svc_info.service.targetPort,
-            protocol="TCP",
-        )
-        svc.spec.ports = [port]
-        svc.spec.selector = {"app": k8s_name}
+        svc_meta = k8s_metadata(k8s_name, meta.namespace, svc_labels)
 
+        # Retain the labels and annotations of the existing Service.
         db_key = watch_key(meta, is_canary)
         try:
             old = db.apps[meta.name][meta.env].resources["Service"].manifests[db_key]
             old = old["metadata"]
-            svc.metadata.labels = old["labels"] | svc.metadata.labels
-            svc.metadata.annotations = old["annotations"] | svc.metadata.annotations
+            svc_meta["labels"] = old["labels"] | svc_meta["labels"]
+            svc_meta["annotations"] = old["annotations"] | svc_meta["annotations"]
         except KeyError:
             pass
 
-        out[db_key] = svc.model_dump()
+        # NOTE: the manifest has the same structure as a `K8sService.model_dump()`.
+        out[db_key] = {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": svc_meta,
+            "spec": {
+                "ports": [
+                    {
+                        "name": "http2",
+                        "port": svc_info.service.port,
+                        "appProtocol": "http2",
+                        "protocol": "TCP",
+                        "targetPort": svc_info.service.targetPort,
+                    }
+                ],
+                "selector": {"app": k8s_name},
+            },
+        }
 
     return out
 
 
-def istio_manifests(cfg: ServerConfig, app_info: AppInfo) -> Tuple[dict, dict, bool]:
-    """Produce the VirtualService and Destination to support a Canary deployment."""
+def istio_manifests(
+    cfg: ServerConfig, app_info: AppInfo, labels: Dict[str, str] | None = None
+) -> Tuple[dict, dict, bool]:
+    """Produce the VirtualService and Destination to support a Canary deployment.
+
+    The `labels` default to the labels of the primary, ie
+    `resource_labels(cfg, app_info.metadata, False)`.
+
+    """
     # Convenience.
     meta = app_info.metadata
     name = app_info.metadata.name
@@ -210,6 +290,9 @@ def istio_manifests(cfg: ServerConfig, app_info: AppInfo) -> Tuple[dict, dict, b
         logit.error(f"invalid canary percentage {app_info.canary.trafficPercent}")
         return {}, {}, True
 
+    if labels is None:
+        labels = resource_labels(cfg, meta, False)
+
     weight_canary = app_info.canary.trafficPercent
     weight_primary = 100 - weight_canary
 
@@ -224,42 +307,34 @@ def istio_manifests(cfg: ServerConfig, app_info: AppInfo) -> Tuple[dict, dict, b
     )
 
     # Construct the VirtualService to split traffic among two hard coded
-    # DestinationRule subsets.
-    vs_spec = {
-        "hosts": [name],
-        "http": [{"route": [route_primary, route_canary]}],
+    # DestinationRule subsets. It has the same structure as a
+    # `K8sVirtualService.model_dump()`.
+    vs = {
+        "apiVersion": "networking.istio.io/v1beta1",
+        "kind": "VirtualService",
+        "metadata": k8s_metadata(name, meta.namespace, labels),
+        "spec": {
+            "hosts": [name],
+            "http": [{"route": [route_primary, route_canary]}],
+        },
     }
-    vs = K8sVirtualService(
-        apiVersion="networking.istio.io/v1beta1",
-        kind="VirtualService",
-        metadata=K8sMetadata(
-            name=name,
-            namespace=meta.namespace,
-            labels=resource_labels(cfg, meta, False),
-        ),
-        spec=K8sVirtualService.Spec.model_validate(vs_spec),
-    )
 
-    # Construct the DestinationRule for two hard coded subsets.
-    dr_spec = {
-        "host": name,
-        "subsets": [
-            {"name": "primary", "labels": {"deployment-type": "primary"}},
-            {"name": "canary", "labels": {"deployment-type": "canary"}},
-        ],
+    # Construct the DestinationRule for two hard coded subsets. It has the
+    # same structure as a `K8sDestinationRule.model_dump()`.
+    dr = {
+        "apiVersion": "networking.istio.io/v1beta1",
+        "kind": "DestinationRule",
+        "metadata": k8s_metadata(name, meta.namespace, labels),
+        "spec": {
+            "host": name,
+            "subsets": [
+                {"name": "primary", "labels": {"deployment-type": "primary"}},
+                {"name": "canary", "labels": {"deployment-type": "canary"}},
+            ],
+        },
     }
-    dr = K8sDestinationRule(
-        apiVersion="networking.istio.io/v1beta1",
-        kind="DestinationRule",
-        metadata=K8sMetadata(
-            name=name,
-            namespace=meta.namespace,
-            labels=resource_labels(cfg, meta, False),
-        ),
-        spec=K8sDestinationRule.Spec.model_validate(dr_spec),
-    )
 
-    return (vs.model_dump(), dr.model_dump(), False)
+    return (vs, dr, False)
 
 
 def manifests_from_appinfo(
@@ -291,23 +366,30 @@ def manifests_from_appinfo(
         primary_base = None
         canary_base = None
 
+    # Compile the labels for primary and canary once and share them among all
+    # the resources.
+    labels = {
+        False: resource_labels(cfg, meta, False),
+        True: resource_labels(cfg, meta, True),
+    }
+
     # Add the primary deployment.
-    dm = deployment_manifest(cfg, app_info, canary=False, base=primary_base)
+    dm = deployment_manifest(cfg, app_info, False, primary_base, labels[False])
     out.resources["Deployment"].manifests[primary] = dm
 
     # Add the canary deployment if we have one.
     if app_info.hasCanary:
-        dm = deployment_manifest(cfg, app_info, canary=True, base=canary_base)
+        dm = deployment_manifest(cfg, app_info, True, canary_base, labels[True])
         out.resources["Deployment"].manifests[canary] = dm
 
-        vs, dr, err = istio_manifests(cfg, app_info)
+        vs, dr, err = istio_manifests(cfg, app_info, labels[False])
         if err:
             return GeneratedManifests(), True
         out.resources["VirtualService"].manifests[primary] = vs
         out.resources["DestinationRule"].manifests[primary] = dr
 
     # Add service manifests.
-    for name, manifest in service_manifests(cfg, db, app_info).items():
+    for name, manifest in service_manifests(cfg, db, app_info, labels).items():
         out.resources["Service"].manifests[name] = manifest
 
     return out, False
@@ -326,8 +408,9 @@ def appinfo_from_manifests(
     # Validate these resource types with their respective Pydantic models.
     kinds = (("Deployment", K8sDeployment), ("Service", K8sService))
 
-    # Validate all manifests.
+    # Validate all manifests and keep the models to compile the `AppInfo` below.
     all_metadata = []
+    models: Dict[str, list] = {kind: [] for kind, _ in kinds}
     for kind, Model in kinds:
         if kind not in k8s_resources:
             k8s_resources[kind] = WatchedResource(apiVersion="", kind=kind, path="")
@@ -355,8 +438,7 @@ def appinfo_from_manifests(
                 return AppInfo(), True
 
             all_metadata.append(meta)
-            del manifest
-        del kind, Model
+            models[kind].append(model)
 
     if len(all_metadata) == 0:
         logit.info("Nothing to import")
@@ -364,20 +446,22 @@ def appinfo_from_manifests(
 
     # Abort unless all manifests produced the same metadata for the app.
     meta = all_metadata[0]
-    for _ in all_metadata:
-        assert _ == meta
+    if any(m != meta for m in all_metadata[1:]):
+        logit.error("Inconsistent metadata across manifests")
+        return AppInfo(), True
     out.metadata = meta
-    del all_metadata
 
     # Compile the primary/canary deployment info.
-    reseved_envs = set(dfh.defaults.RESERVED_FIELDREF_ENVS)
-    for manifest in k8s_resources["Deployment"].manifests.values():
-        model = K8sDeployment.model_validate(manifest)
+    reserved_envs = dfh.defaults.RESERVED_FIELDREF_ENVS_SET
+    for model in models["Deployment"]:
         container = model.spec.template.spec.containers[0]
-        envVars = [K8sEnvVar(name=el.name, value=el.value) for el in container.env]
 
-        # Remove all the reserved env vars that the user cannot control
-        envVars = [_ for _ in envVars if _.name not in reseved_envs]
+        # Skip all the reserved env vars that the user cannot control.
+        envVars = [
+            K8sEnvVar(name=el.name, value=el.value)
+            for el in container.env
+            if el.name not in reserved_envs
+        ]
 
         deploy_info = DeploymentInfo(
             isFlux=False,
@@ -416,8 +500,7 @@ def appinfo_from_manifests(
             out.primary.deployment = deploy_info
 
     # Compile the primary/canary service info.
-    for manifest in k8s_resources["Service"].manifests.values():
-        model = K8sService.model_validate(manifest)
+    for model in models["Service"]:
         svc = AppService(
             port=model.spec.ports[0].port,
             targetPort=model.spec.ports[0].targetPort,
@@ -443,30 +526,7 @@ async def compile_plan(
         new_app.metadata.env,
     )
 
-    square_cfg = square_config(cfg, name, ns, env)
-    sq_client, err = await square.k8s.cluster_config(
-        cfg.kubeconfig,
-        cfg.kubecontext,
-        conparams=square.dtypes.ConnectionParameters(read=600, write=600, pool=600),
-    )
-    assert not err
-
-    # Compile the manifests into Square data structures and treat
-    # them as the `local` ones.
-    local_manifests: square.dtypes.SquareManifests = {}
-    if not remove:
-        # Generate the deployment manifests (primary and canary).
-        new_manifests, err = manifests_from_appinfo(cfg, new_app, db)
-        assert not err
-
-        for kind in new_manifests.resources:
-            if kind == "Pod":
-                continue
-            for manifest in new_manifests.resources[kind].manifests.values():
-                local_manifests[square.manio.make_meta(manifest)] = manifest
-
     # Get a handle the app's resources assuming the app exists in DFH.
-    server_manifests: square.dtypes.SquareManifests = {}
     try:
         server_res = db.apps[name][env].resources
     except KeyError:
@@ -474,12 +534,53 @@ async def compile_plan(
 
     # Compile the latest set of resources from K8s into Square data structures
     # and treat them as the `server` ones.
+    # NOTE: do this before we generate the local manifests in a thread since
+    # the watchers may update `db` in the meantime. This ensures the server
+    # state is never newer than the base manifests we generate from.
+    server_manifests: square.dtypes.SquareManifests = {}
     for kind in server_res:
         if kind == "Pod":
             continue
         for manifest in server_res[kind].manifests.values():
             server_manifests[square.manio.make_meta(manifest)] = manifest
 
+    # Create the K8s client in the background while we generate the manifests.
+    square_cfg = square_config(cfg, name, ns, env)
+    sq_client_task = asyncio.create_task(
+        square.k8s.cluster_config(
+            cfg.kubeconfig,
+            cfg.kubecontext,
+            conparams=square.dtypes.ConnectionParameters(
+                read=600, write=600, pool=600
+            ),
+        )
+    )
+
+    try:
+        # Compile the manifests into Square data structures and treat
+        # them as the `local` ones.
+        local_manifests: square.dtypes.SquareManifests = {}
+        if not remove:
+            # Generate the deployment manifests (primary and canary). This is
+            # CPU bound and runs in a thread to not block the event loop.
+            new_manifests, err = await asyncio.to_thread(
+                manifests_from_appinfo, cfg, new_app, db
+            )
+            assert not err
+
+            for kind in new_manifests.resources:
+                if kind == "Pod":
+                    continue
+                for manifest in new_manifests.resources[kind].manifests.values():
+                    local_manifests[square.manio.make_meta(manifest)] = manifest
+
+        sq_client, err = await sq_client_task
+        assert not err
+    finally:
+        # Do not leave the background task behind if we abort early.
+        if not sq_client_task.done():
+            sq_client_task.cancel()
+
     # Compute the plan and return it.
     return await square.square.compile_plan(
         square_cfg, sq_client, local_manifests, server_manifests
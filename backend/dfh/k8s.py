@@ -1,13 +1,14 @@
 import asyncio
-import json
 import logging
 import ssl
 from datetime import UTC, datetime
+from operator import attrgetter
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 from urllib.parse import urlparse
 
 import httpx
+import orjson
 import tenacity as tc
 from square.k8s import K8sConfig
 
@@ -89,8 +90,8 @@ async def request(
 
     # Decode the JSON response and abort if that is impossible.
     try:
-        response = json.loads(ret.text)
-    except json.decoder.JSONDecodeError as err:
+        response = orjson.loads(ret.content)
+    except orjson.JSONDecodeError as err:
         msg = (
             f"JSON error - {k8sconfig.name} - "
             f"{err.msg} in line {err.lineno} column {err.colno}",
@@ -207,3 +208,18 @@ def parse_pod_info(manifest: dict) -> Tuple[PodList.PodInfo, bool]:
         message=status_message or condition_message,
     )
     return info, False
+
+
+def parse_pod_infos(manifests: Iterable[dict]) -> List[PodList.PodInfo]:
+    """Return the info of all valid Pod `manifests` sorted by ID.
+
+    Skip invalid manifests.
+
+    """
+    infos = []
+    for manifest in manifests:
+        info, err = parse_pod_info(manifest)
+        if not err:
+            infos.append(info)
+    infos.sort(key=attrgetter("id"))
+    return infos
@@ -5,38 +5,36 @@ from dfh.models import AppMetadata, ServerConfig
 
 def is_dfh_manifest(cfg: ServerConfig, manifest: dict) -> bool:
     """Return `True` if the `manifest` is managed by DFH."""
-    # Get the labels.
-    try:
-        labels: Dict[str, str] = manifest["metadata"]["labels"]
-    except KeyError:
-        return False
+    _, err = get_metainfo(cfg, manifest)
+    return not err
 
-    # These labels defined whether or not DFH owns this manifest.
-    expected_labels = (
-        cfg.env_label,
-        "app.kubernetes.io/name",
-        "app.kubernetes.io/managed-by",
-    )
 
-    # All expected labels must exist and be non-empty.
-    for name in expected_labels:
-        if labels.get(name, "") == "":
-            return False
+def get_metainfo(cfg: ServerConfig, manifest: dict) -> Tuple[AppMetadata, bool]:
+    """Return the DFH app metadata of the `manifest`.
 
-    # Manifest must be managed by DFH.
-    if labels["app.kubernetes.io/managed-by"] != cfg.managed_by:
-        return False
-    return True
+    Return an error unless DFH manages the `manifest`.
 
+    """
+    # Get the K8s metadata and labels.
+    try:
+        metadata: dict = manifest["metadata"]
+        labels: Dict[str, str] = metadata["labels"]
+    except KeyError:
+        return AppMetadata(), True
 
-def get_metainfo(cfg, manifest: dict) -> Tuple[AppMetadata, bool]:
-    if not is_dfh_manifest(cfg, manifest):
+    # Manifest must be managed by DFH. This is the cheapest check and rejects
+    # most foreign manifests right away.
+    managed_by = labels.get("app.kubernetes.io/managed-by", "")
+    if managed_by == "" or managed_by != cfg.managed_by:
         return AppMetadata(), True
 
-    namespace = manifest["metadata"].get("namespace", "")
-    env = manifest["metadata"]["labels"][cfg.env_label]
-    app_name = manifest["metadata"]["labels"]["app.kubernetes.io/name"]
+    # The app name and environment labels must exist and be non-empty.
+    app_name = labels.get("app.kubernetes.io/name", "")
+    env = labels.get(cfg.env_label, "")
+    if app_name == "" or env == "":
+        return AppMetadata(), True
 
     # Compile MetaInfo for this manifest. This is similar but not identical to
     # the Metadata of each manifest.
+    namespace = metadata.get("namespace", "")
     return AppMetadata(name=app_name, env=env, namespace=namespace), False
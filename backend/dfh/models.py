@@ -68,41 +68,55 @@ class K8sService(BaseModel):
     spec: K8sServiceSpec = K8sServiceSpec()
 
 
-class K8sVirtualService(BaseModel):
-    class Spec(BaseModel):
-        class Route(BaseModel):
-            class Destination(BaseModel):
-                class Subset(BaseModel):
-                    host: str = ""
-                    subset: str = ""
+class K8sVSSubset(BaseModel):
+    host: str = ""
+    subset: str = ""
+
+
+class K8sVSDestination(BaseModel):
+    destination: K8sVSSubset = K8sVSSubset()
+    weight: int
+
 
-                destination: Subset = Subset()
-                weight: int
+class K8sVSRoute(BaseModel):
+    route: List[K8sVSDestination] = []
 
-            route: List[Destination] = []
 
-        hosts: List[str] = []
-        http: List[Route] = []
+class K8sVSSpec(BaseModel):
+    hosts: List[str] = []
+    http: List[K8sVSRoute] = []
+
+
+class K8sVirtualService(BaseModel):
+    # Rarely used because `istio_manifests` builds plain dicts. Only build the
+    # schema on first use to speed up the import.
+    model_config = ConfigDict(defer_build=True)
 
     apiVersion: str = ""
     kind: str = ""
     metadata: K8sMetadata = K8sMetadata()
-    spec: Spec = Spec()
+    spec: K8sVSSpec = K8sVSSpec()
 
 
-class K8sDestinationRule(BaseModel):
-    class Spec(BaseModel):
-        class Subset(BaseModel):
-            name: str = ""
-            labels: Dict[str, str] = {}
+class K8sDRSubset(BaseModel):
+    name: str = ""
+    labels: Dict[str, str] = {}
+
+
+class K8sDRSpec(BaseModel):
+    host: str = ""
+    subsets: List[K8sDRSubset] = []
 
-        host: str = ""
-        subsets: List[Subset] = []
+
+class K8sDestinationRule(BaseModel):
+    # Rarely used because `istio_manifests` builds plain dicts. Only build the
+    # schema on first use to speed up the import.
+    model_config = ConfigDict(defer_build=True)
 
     apiVersion: str = ""
     kind: str = ""
     metadata: K8sMetadata = K8sMetadata()
-    spec: Spec = Spec()
+    spec: K8sDRSpec = K8sDRSpec()
 
 
 # Define the Pydantic models
@@ -271,34 +285,40 @@ class WatchedResource(BaseModel):
     manifests: Dict[str, dict] = {}
 
 
+# Template for `factory_WatchedResource`. Build it only once since the values
+# never change.
+_WATCHED_RESOURCES = (
+    WatchedResource(kind="Namespace", apiVersion="v1", path="/api/v1/namespaces"),
+    WatchedResource(kind="Pod", apiVersion="v1", path="/api/v1/pods"),
+    WatchedResource(kind="Service", apiVersion="v1", path="/api/v1/services"),
+    WatchedResource(
+        kind="Deployment", apiVersion="apps/v1", path="/apis/apps/v1/deployments"
+    ),
+    WatchedResource(
+        apiVersion="networking.istio.io/v1beta1",
+        kind="VirtualService",
+        path="/apis/networking.istio.io/v1beta1/virtualservices",
+    ),
+    WatchedResource(
+        apiVersion="networking.istio.io/v1beta1",
+        kind="DestinationRule",
+        path="/apis/networking.istio.io/v1beta1/destinationrules",
+    ),
+)
+
+
 def factory_WatchedResource() -> Dict[str, WatchedResource]:
-    """Aggregate all the monitored resources["
+    """Aggregate all the monitored resources.
 
     There is one `Watch` instance for each resource.
+
     """
-    data = dict(
-        Namespace=WatchedResource(
-            kind="Namespace", apiVersion="v1", path="/api/v1/namespaces"
-        ),
-        Pod=WatchedResource(kind="Pod", apiVersion="v1", path="/api/v1/pods"),
-        Service=WatchedResource(
-            kind="Service", apiVersion="v1", path="/api/v1/services"
-        ),
-        Deployment=WatchedResource(
-            kind="Deployment", apiVersion="apps/v1", path="/apis/apps/v1/deployments"
-        ),
-        VirtualService=WatchedResource(
-            apiVersion="networking.istio.io/v1beta1",
-            kind="VirtualService",
-            path="/apis/networking.istio.io/v1beta1/virtualservices",
-        ),
-        DestinationRule=WatchedResource(
-            apiVersion="networking.istio.io/v1beta1",
-            kind="DestinationRule",
-            path="/apis/networking.istio.io/v1beta1/destinationrules",
-        ),
-    )
-    return data
+    # Copy the template without validating it again. Only the `manifests`
+    # are mutable and every copy must have its own.
+    return {
+        res.kind: res.model_copy(update={"manifests": {}})
+        for res in _WATCHED_RESOURCES
+    }
 
 
 class AppService(BaseModel):
@@ -417,7 +437,9 @@ class DatabaseAppEntry(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
     appInfo: AppInfo
-    resources: Dict[str, WatchedResource] = factory_WatchedResource()
+    resources: Dict[str, WatchedResource] = Field(
+        default_factory=factory_WatchedResource
+    )
 
 
 class K8sDatabase(BaseModel):
@@ -427,13 +449,17 @@ class K8sDatabase(BaseModel):
     apps: Dict[str, Dict[str, DatabaseAppEntry]] = {}
 
     # All tracked K8s resources. Those may or may not be part of an app.
-    resources: Dict[str, WatchedResource] = factory_WatchedResource()
+    resources: Dict[str, WatchedResource] = Field(
+        default_factory=factory_WatchedResource
+    )
 
 
 class GeneratedManifests(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    resources: Dict[str, WatchedResource] = factory_WatchedResource()
+    resources: Dict[str, WatchedResource] = Field(
+        default_factory=factory_WatchedResource
+    )
 
 
 # ----------------------------------------------------------------------
@@ -456,11 +482,12 @@ class UAMUser(BaseModel):
     @field_validator("name", "lanid", "slack")
     @classmethod
     def valid_name(cls, v: str) -> str:
-        if len(v) != len(v.strip()):
-            raise ValueError("must not have leading or trailing whitespace")
-
         if len(v) == 0:
             raise ValueError("must be nonempty")
+
+        # Only inspect both ends instead of creating a stripped copy.
+        if v[0].isspace() or v[-1].isspace():
+            raise ValueError("must not have leading or trailing whitespace")
         return v
 
 
@@ -479,11 +506,12 @@ class UAMGroup(BaseModel):
     @field_validator("name", "owner")
     @classmethod
     def valid_name(cls, v: str) -> str:
-        if len(v) != len(v.strip()):
-            raise ValueError("must not have leading or trailing whitespace")
-
         if len(v) == 0:
             raise ValueError("must be nonempty")
+
+        # Only inspect both ends instead of creating a stripped copy.
+        if v[0].isspace() or v[-1].isspace():
+            raise ValueError("must not have leading or trailing whitespace")
         return v
 
 
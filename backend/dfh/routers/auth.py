@@ -1,8 +1,11 @@
+import asyncio
 import base64
 import logging
 from typing import Annotated
 
+import httpx
 import itsdangerous
+import orjson
 from fastapi import (
     APIRouter,
     Depends,
@@ -13,21 +16,16 @@ from fastapi import (
 )
 
 from dfh.models import GoogleToken, ServerConfig, UserMe, UserToken
-from dfh.routers.dependencies import can_login, is_authenticated
 
-from .dependencies import d_db
+from .dependencies import can_login, d_db, is_authenticated
 from .shared import get_config
 
-# Request a token to query the user's email.
-SCOPES = [
-    "https://www.googleapis.com/auth/userinfo.profile",
-    "https://www.googleapis.com/auth/userinfo.email",
-    "openid",
-]
-
 router = APIRouter()
 logit = logging.getLogger("app")
 
+# Official Google endpoint to query user information.
+GOOGLE_USERINFO_URL = httpx.URL("https://www.googleapis.com/oauth2/v3/userinfo")
+
 
 @router.post("/validate-google-bearer-token")
 async def google_auth_bearer(
@@ -38,24 +36,25 @@ async def google_auth_bearer(
     db: d_db,
 ):
     """Query user info from Google and mark the user as logged in."""
-    # Official Google endpoint to query user information.
-    url = f"https://www.googleapis.com/oauth2/v3/userinfo?access_token={data.token}"
-    resp = await cfg.httpclient.get(url)
+    # Let HTTPX encode the token as a query parameter.
+    params = {"access_token": data.token}
+    resp = await cfg.httpclient.get(GOOGLE_USERINFO_URL, params=params)
     if resp.status_code != 200:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid ID token"
         )
-    email = resp.json()["email"]
+    email = orjson.loads(resp.content)["email"]
 
-    # Verify the user is allowed to login.
-    can_login(db, email)
+    # Verify the user is allowed to login. The Spanner client is synchronous
+    # and must therefore not run on the event loop.
+    await asyncio.to_thread(can_login, db, email)
 
     request.session["email"] = email
     response.set_cookie(key="email", value=email)
 
 
 @router.get("/clear-session")
-def clear_session_credentials(request: Request, response: Response):
+async def clear_session_credentials(request: Request, response: Response):
     """Clear the browser session."""
     request.session.pop("credentials", None)
     request.session.pop("email", None)
@@ -64,23 +63,23 @@ def clear_session_credentials(request: Request, response: Response):
 
 
 @router.get("/users/me", dependencies=[Depends(is_authenticated)])
-def get_user_me(email: Annotated[str, Depends(is_authenticated)]) -> UserMe:
+async def get_user_me(email: Annotated[str, Depends(is_authenticated)]) -> UserMe:
     """Return user name."""
     return UserMe(email=email)
 
 
-def mint_token(email: str, key: str) -> UserToken:
-    """Return a timestamped API token."""
-    data = UserToken(email=email, token="")
-    serializer = itsdangerous.TimestampSigner(key)
-    token = serializer.sign(base64.b64encode(data.model_dump_json().encode())).decode()
-    data.token = token
-    return data
+def mint_token(email: str, serializer: itsdangerous.TimestampSigner) -> UserToken:
+    """Return a timestamped API token signed by `serializer`."""
+    # The payload is the JSON encoded `UserToken` without the token itself.
+    # Encode it directly instead of creating a throwaway model first.
+    payload = orjson.dumps({"email": email, "token": ""})
+    token = serializer.sign(base64.b64encode(payload)).decode()
+    return UserToken(email=email, token=token)
 
 
 @router.get("/users/token", dependencies=[Depends(is_authenticated)])
-def get_user_token(
+async def get_user_token(
     request: Request, email: Annotated[str, Depends(is_authenticated)]
 ) -> UserToken:
     """Return API token."""
-    return mint_token(email, request.app.extra["api-token-key"])
+    return mint_token(email, request.app.extra["api-token-signer"])
@@ -1,7 +1,9 @@
 import logging
+from functools import lru_cache
+from pathlib import Path
 
 from fastapi import APIRouter, status
-from fastapi.responses import FileResponse
+from fastapi.responses import HTMLResponse
 
 # Convenience.
 logit = logging.getLogger("app")
@@ -15,12 +17,23 @@ router = APIRouter()
 
 @router.get("/healthz")
 @router.get("/demo/api/healthz")
-def get_healthz() -> int:
+async def get_healthz() -> int:
     """Health check endpoint. Always returns 200."""
     return status.HTTP_200_OK
 
 
+@lru_cache
+def load_index_html() -> bytes:
+    """Return the entry page of the static web app.
+
+    The page never changes at runtime and the web app requests it for every
+    navigation. Read it only once instead of on every request.
+
+    """
+    return Path("static/index.html").read_bytes()
+
+
 # Serve static web app on all paths that have not been defined explicitly.
 @router.get("/{path:path}", include_in_schema=False)
 async def catch_all():
-    return FileResponse("static/index.html")
+    return HTMLResponse(load_index_html())
@@ -1,10 +1,10 @@
-from collections import defaultdict
 from pathlib import Path
 from typing import List
 
 import square.dtypes
 import square.k8s
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
 from square.square import DeploymentPlan
 
 import dfh
@@ -27,22 +27,28 @@ from dfh.models import (
 
 router = APIRouter()
 
+# Serialise the (potentially long) lists of the GET endpoints straight to JSON.
+# This avoids the validation round-trip FastAPI would otherwise perform for the
+# response model of each request.
+_APP_LIST_ADAPTER = TypeAdapter(List[AppEnvOverview])
 
-@router.get("/v1/pods")
-def get_pods(request: Request) -> PodList:
+
+def json_response(content: bytes | str) -> Response:
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/v1/pods", response_model=PodList)
+async def get_pods(request: Request) -> Response:
     db: K8sDatabase = request.app.extra["db"]
 
-    ret = PodList()
-    for manifest in db.resources["Pod"].manifests.values():
-        info, err = dfh.k8s.parse_pod_info(manifest)
-        ret.items.append(info) if not err else None
-    ret.items.sort(key=lambda _: _.id)
+    manifests = db.resources["Pod"].manifests
+    ret = PodList(items=dfh.k8s.parse_pod_infos(manifests.values()))
 
-    return ret
+    return json_response(ret.model_dump_json())
 
 
-@router.get("/v1/pods/{name}/{env}")
-def get_pods_name_env(name: str, env: str, request: Request) -> PodList:
+@router.get("/v1/pods/{name}/{env}", response_model=PodList)
+async def get_pods_name_env(name: str, env: str, request: Request) -> Response:
     db: K8sDatabase = request.app.extra["db"]
 
     # Get the pods for the app or return 404 if there is no such app.
@@ -54,43 +60,38 @@ def get_pods_name_env(name: str, env: str, request: Request) -> PodList:
         )
 
     # Return all the pods of this app.
-    ret = PodList()
-    for manifest in manifests.values():
-        info, err = dfh.k8s.parse_pod_info(manifest)
-        ret.items.append(info) if not err else None
-    ret.items.sort(key=lambda _: _.id)
+    ret = PodList(items=dfh.k8s.parse_pod_infos(manifests.values()))
 
-    return ret
+    return json_response(ret.model_dump_json())
 
 
-@router.get("/v1/namespaces")
-def get_namespaces(request: Request) -> WatchedResource:
+@router.get("/v1/namespaces", response_model=WatchedResource)
+async def get_namespaces(request: Request) -> Response:
     db: K8sDatabase = request.app.extra["db"]
-    return db.resources["Namespace"]
 
+    # Serialise the namespace manifests directly because re-validating all of
+    # them on the way out would be expensive.
+    return json_response(db.resources["Namespace"].model_dump_json())
 
-@router.get("/v1/apps")
-def get_apps(request: Request) -> List[AppEnvOverview]:
-    db: K8sDatabase = request.app.extra["db"]
 
-    # Iterate over our app database in order to find the name of all apps and
-    # the environments they are deployed in.
-    apps = defaultdict(list)
-    for app_name in db.apps:
-        for env in db.apps[app_name]:
-            apps[app_name].append(env)
+@router.get("/v1/apps", response_model=List[AppEnvOverview])
+async def get_apps(request: Request) -> Response:
+    db: K8sDatabase = request.app.extra["db"]
 
-    # Convert the apps into a list of `AppOverview` instances that are easy to
-    # understand for the frontend.
-    resp: List[AppEnvOverview] = []
-    for name, envs in dict(apps).items():
-        resp.append(AppEnvOverview(id=name, name=name, envs=list(sorted(envs))))
+    # Compile the name of all apps and the environments they are deployed in
+    # into `AppOverview` instances that are easy to understand for the frontend.
+    # NOTE: skip apps without any environments.
+    resp = [
+        AppEnvOverview(id=name, name=name, envs=sorted(envs))
+        for name, envs in db.apps.items()
+        if envs
+    ]
 
-    return resp
+    return json_response(_APP_LIST_ADAPTER.dump_json(resp))
 
 
 @router.get("/v1/apps/{name}/{env}")
-def get_single_app(name: str, env: str, request: Request) -> AppInfo:
+async def get_single_app(name: str, env: str, request: Request) -> AppInfo:
     db: K8sDatabase = request.app.extra["db"]
     try:
         return db.apps[name][env].appInfo
@@ -142,9 +143,8 @@ async def post_single_app(name: str, env: str, app_info: AppInfo, request: Reque
             db.apps[name][env].resources[kind].manifests[man_name] = manifest
 
 
-async def queue_job(app, jobId: str, sq_plan: DeploymentPlan):
-    app.extra["jobs"] = app.extra.get("jobs", {})
-    app.extra["jobs"][jobId] = sq_plan
+def queue_job(app, jobId: str, sq_plan: DeploymentPlan):
+    app.extra.setdefault("jobs", {})[jobId] = sq_plan
 
 
 @router.patch("/v1/apps/{name}/{env}")
@@ -173,7 +173,7 @@ async def patch_single_app(
     assert not err
     plan = dfh.generate.compile_frontend_plan(sq_plan)
 
-    await queue_job(request.app, plan.jobId, sq_plan)
+    queue_job(request.app, plan.jobId, sq_plan)
 
     return plan
 
@@ -196,14 +196,14 @@ async def delete_single_app(
     assert not err
     plan = dfh.generate.compile_frontend_plan(sq_plan)
 
-    await queue_job(request.app, plan.jobId, sq_plan)
+    queue_job(request.app, plan.jobId, sq_plan)
     db.apps[name].pop(env, None)
 
     return plan
 
 
 @router.get("/v1/jobs/{jobId}")
-def get_jobs(jobId: str) -> JobStatus:
+async def get_jobs(jobId: str) -> JobStatus:
     return JobStatus(jobId=jobId, logs=["line 1", "line 2"], done=True)
 
 
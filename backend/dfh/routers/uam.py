@@ -1,11 +1,12 @@
 import asyncio
 import logging
 from collections import defaultdict
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Tuple
 
 from fastapi import APIRouter, HTTPException, status
 from google.cloud import spanner
 from google.cloud.spanner_v1.database import Database
+from google.cloud.spanner_v1.snapshot import Snapshot
 from google.cloud.spanner_v1.transaction import Transaction
 
 from dfh.models import (
@@ -51,24 +52,22 @@ def can_edit_existing_group(db: Database, user: str, group: UAMGroup | None):
     if not group:
         return
 
-    # Fetch root users.
+    # Group owner has EDIT permissions. This check needs no Spanner query.
+    if user == group.owner:
+        return
+
+    # Root users always have EDIT permissions. Special case: everybody is root
+    # if the root users contain "*". Only read those two keys.
     with db.snapshot() as snapshot:
         rows = snapshot.read(
-            table="OrgRootUsers", columns=["email"], keyset=spanner.KeySet(all_=True)
+            table="OrgRootUsers",
+            columns=["email"],
+            keyset=spanner.KeySet(keys=[[user], ["*"]]),
         )
         root_users = {_[0] for _ in rows if _[0] != ""}
-
-    # Root users always have EDIT permissions.
-    if user in root_users:
-        return
-
-    # Special case: everybody is root.
-    if "*" in root_users:
+    if len(root_users) > 0:
         return
 
-    # Group owner has EDIT permissions.
-    if user == group.owner:
-        return
     raise HTTPException(status.HTTP_403_FORBIDDEN, detail="insufficient permissions")
 
 
@@ -211,14 +210,22 @@ async def put_group_members(user: d_user, db: d_db, name: str, emails: List[str]
     group = group_must_exist(db, name)
     can_edit_existing_group(db, user, group)
 
-    # Abort unless all emails exist in our database.
-    all_users = spanner_get_all_users(db)
-    try:
-        users = {email: all_users[email] for email in emails}
-    except KeyError as e:
-        raise HTTPException(status_code=404, detail=f"user {e} not found")
+    # Remove duplicates but retain the order.
+    users = list(dict.fromkeys(emails))
 
     def sync_users(transaction: Transaction):
+        # 0. Abort unless all emails exist in our database. Only read those
+        # users and do so in the same transaction that updates the group.
+        rows = transaction.read(
+            table="OrgUsers",
+            columns=["email"],
+            keyset=spanner.KeySet(keys=[[_] for _ in users]),
+        )
+        existing = {_[0] for _ in rows}
+        for email in users:
+            if email not in existing:
+                raise HTTPException(status_code=404, detail=f"user {email!r} not found")
+
         # 1. Remove users from the group who are NOT in the given list
         delete_query = """
             DELETE FROM OrgGroupsUsers
@@ -226,7 +233,7 @@ async def put_group_members(user: d_user, db: d_db, name: str, emails: List[str]
         """
         transaction.execute_update(
             delete_query,
-            params={"group_id": name, "user_list": list(users)},
+            params={"group_id": name, "user_list": users},
             param_types={
                 "group_id": spanner.param_types.STRING,
                 "user_list": spanner.param_types.Array(spanner.param_types.STRING),
@@ -260,13 +267,18 @@ async def put_add_child_group(db: d_db, user: d_user, name: str, new: UAMChild):
     all_groups = await run_async(spanner_get_all_groups, db)
 
     def is_descendant(pname: str, node_name: str) -> bool:
-        if node_name == pname:
-            return True
-
-        ret = False
-        for child_name in all_groups[node_name].children:
-            ret |= is_descendant(pname, child_name)
-        return ret
+        """Return `True` if `pname` is `node_name` or one of its descendants."""
+        # Search the sub-tree iteratively and visit each group at most once.
+        seen, stack = {node_name}, [node_name]
+        while stack:
+            gname = stack.pop()
+            if gname == pname:
+                return True
+            for child_name in all_groups[gname].children:
+                if child_name not in seen:
+                    seen.add(child_name)
+                    stack.append(child_name)
+        return False
 
     child = await run_async(spanner_make_group, db, new.child)
 
@@ -322,25 +334,20 @@ async def get_users_in_group(
     Use `recursive=True` to include all users in all sub-groups.
 
     """
-    all_groups = spanner_get_all_groups(db)
-    all_users = spanner_get_all_users(db)
+    all_groups, all_users = await run_async(spanner_get_all_groups_and_users, db)
 
     if name not in all_groups:
         raise HTTPException(status_code=404, detail="group not found")
 
     users: Dict[str, UAMUser] = {}
 
-    def _walk(gname: str):
-        group = all_groups[gname]
-        tmp = {_: all_users[_] for _ in group.users}
-
-        users.update(tmp)
-        for child in group.children:
-            _walk(child)
-
     # Either compile users recursively or collect them just from this group.
     if recursive:
-        _walk(name)
+        stack = [name]
+        while stack:
+            group = all_groups[stack.pop()]
+            users.update({_: all_users[_] for _ in group.users})
+            stack.extend(group.children)
     else:
         users = {all_users[_].email: all_users[_] for _ in all_groups[name].users}
 
@@ -403,21 +410,8 @@ async def get_user_permissions(db: d_db, username: str) -> UAMUserRoles:
     """Returns all the permissions a user has inherited from its various group memberships."""
     user_must_exist(db, username)
 
-    @handle_spanner_exceptions
-    def work():
-        with db.snapshot() as snapshot:
-            cols = ["group_id", "roles"]
-            rows = snapshot.read(
-                table="OrgGroupsRoles",
-                columns=cols,
-                keyset=spanner.KeySet(all_=True),
-            )
-            group_roles = {_[0]: _[1] for _ in rows}
-
-        all_groups = spanner_get_all_groups(db)
-        return all_groups, group_roles
-
-    all_groups, group_roles = await run_async(work)
+    # NOTE: the groups already contain their roles.
+    all_groups = await run_async(spanner_get_all_groups, db)
 
     # ----------------------------------------------------------------------
     # Traverse the entire tree and track the parent nodes as we do so.
@@ -427,16 +421,15 @@ async def get_user_permissions(db: d_db, username: str) -> UAMUserRoles:
     # ----------------------------------------------------------------------
     group_pool: Set[str] = set()
 
-    def walk(gname: str, parents: List[str]):
-        parents.append(gname)
-        members = set(all_groups[gname].users)
-        if username in members:
+    # NOTE: use an explicit stack instead of recursion and track the path from
+    # the root as an immutable tuple to avoid any backtracking.
+    stack: List[Tuple[str, Tuple[str, ...]]] = [(ROOT_NAME, (ROOT_NAME,))]
+    while stack:
+        gname, parents = stack.pop()
+        if username in all_groups[gname].users:
             group_pool.update(parents)
         for child in all_groups[gname].children:
-            walk(child, parents)
-        parents.pop()
-
-    walk(ROOT_NAME, [])
+            stack.append((child, parents + (child,)))
     del username
 
     # ----------------------------------------------------------------------
@@ -445,7 +438,7 @@ async def get_user_permissions(db: d_db, username: str) -> UAMUserRoles:
     perms = defaultdict(list)
 
     for name in group_pool:
-        for role in group_roles.get(name, []):
+        for role in all_groups[name].roles:
             perms[role].append(name)
 
     # ----------------------------------------------------------------------
@@ -469,14 +462,17 @@ async def get_tree(db: d_db) -> UAMTreeInfo:
 
     groups: Dict[str, UAMGroup] = {}
 
-    def _walk(gname: str) -> UAMTreeNode:
-        groups[gname] = all_groups[gname]
-        node = UAMTreeNode(name=gname)
-        for child_name in all_groups[gname].children:
-            node.children[child_name] = _walk(child_name)
-        return node
+    # Build the tree with an explicit stack instead of recursion. Push the
+    # children in reverse to visit them in the same order as a recursive walk.
+    tree = UAMTreeNode(name=ROOT_NAME)
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        groups[node.name] = all_groups[node.name]
+        for child_name in all_groups[node.name].children:
+            node.children[child_name] = UAMTreeNode(name=child_name)
+        stack.extend(reversed(node.children.values()))
 
-    tree = _walk(ROOT_NAME)
     return UAMTreeInfo(groups=groups, root=tree)
 
 
@@ -499,107 +495,127 @@ def spanner_get_group(db: Database, group_name: str) -> UAMGroup:
     return UAMGroup.model_validate(dict(zip(cols, rows[0])))
 
 
-@handle_spanner_exceptions
-def spanner_get_all_groups(db: Database) -> Dict[str, UAMGroup]:
-    def work(transaction: Transaction):
-        # Fetch all group roles.
-        cols = ["group_id", "roles"]
-        rows = transaction.read(
-            table="OrgGroupsRoles",
-            columns=cols,
-            keyset=spanner.KeySet(all_=True),
-        )
-        rows = list(rows)
-        group_roles = {}
-        for gid, roles in rows:
-            group_roles[gid] = roles
+def read_all_groups(snapshot: Snapshot) -> Dict[str, UAMGroup]:
+    """Return all groups with their roles, users and child groups.
 
-        # Fetch all group - user relations.
-        cols = ["group_id", "user_id"]
-        rows = transaction.read(
-            table="OrgGroupsUsers",
-            columns=cols,
-            keyset=spanner.KeySet(all_=True),
-        )
-        rows = list(rows)
-        users_per_group = defaultdict(list)
-        for parent, child in rows:
-            users_per_group[parent].append(child)
+    The `snapshot` must be multi-use since this function issues several reads.
 
-        # Fetch all group - group relations.
-        cols = ["parent_id", "child_id"]
-        rows = transaction.read(
-            table="OrgGroupsGroups",
-            columns=cols,
-            keyset=spanner.KeySet(all_=True),
-        )
-        rows = list(rows)
-        groups_per_group = defaultdict(list)
-        for parent, child in rows:
-            groups_per_group[parent].append(child)
+    """
+    # Fetch all group roles.
+    cols = ["group_id", "roles"]
+    rows = snapshot.read(
+        table="OrgGroupsRoles",
+        columns=cols,
+        keyset=spanner.KeySet(all_=True),
+    )
+    rows = list(rows)
+    group_roles = {}
+    for gid, roles in rows:
+        group_roles[gid] = roles
+
+    # Fetch all group - user relations.
+    cols = ["group_id", "user_id"]
+    rows = snapshot.read(
+        table="OrgGroupsUsers",
+        columns=cols,
+        keyset=spanner.KeySet(all_=True),
+    )
+    rows = list(rows)
+    users_per_group = defaultdict(list)
+    for parent, child in rows:
+        users_per_group[parent].append(child)
+
+    # Fetch all group - group relations.
+    cols = ["parent_id", "child_id"]
+    rows = snapshot.read(
+        table="OrgGroupsGroups",
+        columns=cols,
+        keyset=spanner.KeySet(all_=True),
+    )
+    rows = list(rows)
+    groups_per_group = defaultdict(list)
+    for parent, child in rows:
+        groups_per_group[parent].append(child)
+
+    cols = ["email", "owner", "provider", "description"]
+    rows = snapshot.read(
+        table="OrgGroups",
+        columns=cols,
+        keyset=spanner.KeySet(all_=True),
+    )
+    rows = list(rows)
 
-        cols = ["email", "owner", "provider", "description"]
-        rows = transaction.read(
-            table="OrgGroups",
-            columns=cols,
-            keyset=spanner.KeySet(all_=True),
-        )
-        rows = list(rows)
+    # fixme: change UAM.name -> UAM.email
+    cols[0] = "name"
+    tmp = [UAMGroup.model_validate(dict(zip(cols, row))) for row in rows]
+    for i in tmp:
+        i.users = users_per_group[i.name]
+        i.children = groups_per_group[i.name]
+        i.roles = group_roles.get(i.name, [])
 
-        # fixme: change UAM.name -> UAM.email
-        cols[0] = "name"
-        tmp = [UAMGroup.model_validate(dict(zip(cols, row))) for row in rows]
-        for i in tmp:
-            i.users = users_per_group[i.name]
-            i.children = groups_per_group[i.name]
-            i.roles = group_roles.get(i.name, [])
+    groups = {_.name: _ for _ in tmp}
+    return groups
 
-        groups = {_.name: _ for _ in tmp}
-        return groups
 
-    return db.run_in_transaction(work)
+def read_all_users(snapshot: Snapshot) -> Dict[str, UAMUser]:
+    """Return all users."""
+    cols = ["email", "name", "lanid", "slack", "role", "manager"]
+    rows = snapshot.read(
+        table="OrgUsers",
+        columns=cols,
+        keyset=spanner.KeySet(all_=True),
+    )
+    tmp = [UAMUser.model_validate(dict(zip(cols, row))) for row in rows]
+    return {_.email: _ for _ in tmp}
 
 
 @handle_spanner_exceptions
-def spanner_get_user(db: Database, user_name: str) -> UAMUser:
-    cols = ["email", "name", "lanid", "slack", "role", "manager"]
+def spanner_get_all_groups(db: Database) -> Dict[str, UAMGroup]:
+    # All reads must see the same data but none of them write. A read-only
+    # snapshot guarantees that without locks or a commit.
+    with db.snapshot(multi_use=True) as snapshot:
+        return read_all_groups(snapshot)
+
+
+@handle_spanner_exceptions
+def spanner_get_all_users(db: Database) -> Dict[str, UAMUser]:
     with db.snapshot() as snapshot:
-        rows = snapshot.read(
-            table="OrgUsers",
-            columns=cols,
-            keyset=spanner.KeySet([[user_name]]),
-        )
-        rows = list(rows)
+        return read_all_users(snapshot)
 
-    if len(rows) != 1:
-        raise HTTPException(status_code=404, detail=f"user {user_name} not found")
 
-    return UAMUser.model_validate(dict(zip(cols, rows[0])))
+@handle_spanner_exceptions
+def spanner_get_all_groups_and_users(
+    db: Database,
+) -> Tuple[Dict[str, UAMGroup], Dict[str, UAMUser]]:
+    """Return all groups and users from the same consistent snapshot."""
+    with db.snapshot(multi_use=True) as snapshot:
+        return read_all_groups(snapshot), read_all_users(snapshot)
 
 
 @handle_spanner_exceptions
-def spanner_get_all_users(db: Database) -> Dict[str, UAMUser]:
+def spanner_get_user(db: Database, user_name: str) -> UAMUser:
     cols = ["email", "name", "lanid", "slack", "role", "manager"]
     with db.snapshot() as snapshot:
         rows = snapshot.read(
             table="OrgUsers",
             columns=cols,
-            keyset=spanner.KeySet(all_=True),
+            keyset=spanner.KeySet([[user_name]]),
         )
         rows = list(rows)
 
-    tmp = [UAMUser.model_validate(dict(zip(cols, row))) for row in rows]
-    users = {_.email: _ for _ in tmp}
-    return users
+    if len(rows) != 1:
+        raise HTTPException(status_code=404, detail=f"user {user_name} not found")
+
+    return UAMUser.model_validate(dict(zip(cols, rows[0])))
 
 
 @handle_spanner_exceptions
 def spanner_make_group(db: Database, group_name: str) -> UAMGroup:
     group = group_must_exist(db, group_name)
 
-    def work(transaction: Transaction) -> UAMGroup:
+    def work(snapshot: Snapshot) -> UAMGroup:
         # Find all roles.
-        rows = transaction.execute_sql(
+        rows = snapshot.execute_sql(
             "SELECT group_id, roles FROM OrgGroupsRoles WHERE group_id=@group",
             param_types={"group": spanner.param_types.STRING},
             params={"group": group_name},
@@ -608,7 +624,7 @@ def spanner_make_group(db: Database, group_name: str) -> UAMGroup:
         roles = [] if len(rows) == 0 else rows[0][1]
 
         # --- Find all users in group.
-        rows = transaction.execute_sql(
+        rows = snapshot.execute_sql(
             "SELECT group_id, user_id FROM OrgGroupsUsers WHERE group_id=@group",
             param_types={"group": spanner.param_types.STRING},
             params={"group": group.name},
@@ -617,7 +633,7 @@ def spanner_make_group(db: Database, group_name: str) -> UAMGroup:
         group.users = users
 
         # --- Find all child groups.
-        rows = transaction.execute_sql(
+        rows = snapshot.execute_sql(
             "SELECT parent_id, child_id FROM OrgGroupsGroups WHERE parent_id=@group",
             param_types={"group": spanner.param_types.STRING},
             params={"group": group.name},
@@ -628,4 +644,5 @@ def spanner_make_group(db: Database, group_name: str) -> UAMGroup:
         group.roles = roles
         return group
 
-    return db.run_in_transaction(work)
+    with db.snapshot(multi_use=True) as snapshot:
+        return work(snapshot)
@@ -16,12 +16,12 @@ ID and starts over.
 """
 
 import asyncio
-import json
 import logging
 import random
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+import orjson
 import square.k8s
 from square.dtypes import ConnectionParameters, K8sConfig
 
@@ -249,8 +249,8 @@ class WatchResource:
 
         # K8s sends JSON encoded lines.
         try:
-            line_json = json.loads(line_raw)
-        except json.JSONDecodeError:
+            line_json = orjson.loads(line_raw)
+        except orjson.JSONDecodeError:
             self.logit.error("K8s sent corrupt JSON payload", meta_log)
             return True
 
@@ -363,7 +363,8 @@ async def setup_k8s_watch(
     try:
         timeout = 120 + int(random.uniform(-10, 10))
         watch = WatchResource(k8scfg, res.path, timeout=timeout, logger=logit)
-        async with k8scfg.client, watch:
+        # NOTE: the caller owns `k8scfg.client` because all watchers share it.
+        async with watch:
             async for data in watch:  # codecov-skip
                 track_resource(cfg, db, res, data)
     except asyncio.CancelledError:
@@ -441,6 +442,10 @@ def track_resource(
         manifest["kind"] = res.kind
         manifest["apiVersion"] = res.apiVersion
 
+        # Drop the `managedFields` because DFH never uses them and they often
+        # account for a large portion of the manifest.
+        manifest.get("metadata", {}).pop("managedFields", None)
+
         upsert_resource(cfg, db, manifest)
     elif evt == "DELETED":
         remove_resource(cfg, db, manifest)
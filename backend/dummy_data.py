@@ -4,6 +4,7 @@ from typing import Dict, Set, Tuple
 
 import faker
 import httpx
+import itsdangerous
 from tqdm import tqdm
 
 import dfh.api
@@ -125,7 +126,9 @@ def main():
     available = set(groups)
     create_hierarchy("Org", available, 0.1, groups)
 
-    token = auth.mint_token("foo@bar.com", "token-key-from-gsm")
+    token = auth.mint_token(
+        "foo@bar.com", itsdangerous.TimestampSigner("token-key-from-gsm")
+    )
     headers = {"Authorization": f"Bearer {token.token}"}
     base_url = "http://localhost:5001/demo/api"
 
@@ -1,6 +1,6 @@
-import asyncio
 import sys
 
+import uvloop
 from hypercorn.asyncio import serve
 from hypercorn.config import Config
 
@@ -12,7 +12,7 @@ if __name__ == "__main__":  # codecov-skip
         dfh.logstreams.setup("info")
         cfg = Config()
         cfg.bind = ["0.0.0.0:8080"]
-        asyncio.run(serve(hello.main.app, cfg))  # type: ignore
+        uvloop.run(serve(hello.main.app, cfg))  # type: ignore
     except KeyboardInterrupt:
         print("User abort")
         sys.exit(1)
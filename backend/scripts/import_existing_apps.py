@@ -10,8 +10,6 @@ Usage:
 import asyncio
 from typing import Dict
 
-import httpx
-
 import dfh.api
 import dfh.generate
 import dfh.k8s
@@ -64,26 +62,27 @@ async def main():
             apps[key][kind].manifests[watch_key(meta, False)] = manifest
 
     # Try to reconstruct the `AppInfo` from the manifests we have gathered and
-    # insert it into DFH.
-    for key, app in apps.items():
-        print(f"Adding {key}: ", end="", flush=True)
-
-        # Reverse engineer an `DeploymentInfo` from the manifest.
-        app_info, err = dfh.generate.appinfo_from_manifests(cfg, app)
-        if err:
-            print("skipped due to parsing error")
-
-        # Reconstruct the AppMetadata for the app.
-        meta = AppMetadata(name=key[0], env=key[1], namespace=key[2])
-
-        # Compile a full `AppInfo` model and ask DFH to add it to its database.
-        url = f"http://{cfg.host}:{cfg.port}/api/crt/v1/apps/{meta.name}/{meta.env}"
-        ret = await httpx.AsyncClient().post(url, json=app_info.model_dump())
-        if ret.status_code != 200:
-            print(f"rejected with code {ret.status_code}")
-            continue
-
-        print("done")
+    # insert it into DFH. Use the same HTTP client for all requests.
+    async with cfg.httpclient:
+        for key, app in apps.items():
+            print(f"Adding {key}: ", end="", flush=True)
+
+            # Reverse engineer an `DeploymentInfo` from the manifest.
+            app_info, err = dfh.generate.appinfo_from_manifests(cfg, app)
+            if err:
+                print("skipped due to parsing error")
+
+            # Reconstruct the AppMetadata for the app.
+            meta = AppMetadata(name=key[0], env=key[1], namespace=key[2])
+
+            # Compile a full `AppInfo` model and ask DFH to add it to its database.
+            url = f"http://{cfg.host}:{cfg.port}/api/crt/v1/apps/{meta.name}/{meta.env}"
+            ret = await cfg.httpclient.post(url, json=app_info.model_dump())
+            if ret.status_code != 200:
+                print(f"rejected with code {ret.status_code}")
+                continue
+
+            print("done")
 
 
 if __name__ == "__main__":
@@ -1,12 +1,21 @@
+import asyncio
+import json
 from pathlib import Path
 from typing import cast
 from unittest import mock
 
+import httpx
+import pydantic
 import pytest
+from fastapi.exceptions import RequestValidationError
 from fastapi.testclient import TestClient
+from square.dtypes import K8sConfig
 
 import dfh.api
 import dfh.k8s
+from dfh.models import UAMUser
+
+from .test_helpers import make_user
 
 
 @pytest.fixture
@@ -42,22 +51,31 @@ class TestBasic:
     def test_make_httpclient_mock(self, m_client, tmp_path: Path):
         env_vars = {"CA_FILE": "~/.foo"}
 
+        # Connection pool and timeouts must be the same for all clients.
+        pool = dict(
+            limits=httpx.Limits(
+                max_connections=200, max_keepalive_connections=50, keepalive_expiry=300
+            ),
+            timeout=httpx.Timeout(connect=10.0, read=600.0, write=600.0, pool=60.0),
+            http2=True,
+        )
+
         with mock.patch.dict("os.environ", values={}, clear=True):
             dfh.api.make_httpclient()
-            m_client.assert_called_once_with(verify="")
+            m_client.assert_called_once_with(verify="", **pool)
 
         env_vars = {"CA_FILE": ""}
         m_client.reset_mock()
         with mock.patch.dict("os.environ", values=env_vars, clear=True):
             dfh.api.make_httpclient()
-            m_client.assert_called_once_with(verify="")
+            m_client.assert_called_once_with(verify="", **pool)
 
         ca = tmp_path / "foo.txt"
         env_vars = {"CA_FILE": str(ca)}
         m_client.reset_mock()
         with mock.patch.dict("os.environ", values=env_vars, clear=True):
             dfh.api.make_httpclient()
-            m_client.assert_called_once_with(verify=str(ca))
+            m_client.assert_called_once_with(verify=str(ca), **pool)
 
     def test_make_httpclient(self, tmp_path: Path):
         # Must pass and use default CAs.
@@ -75,6 +93,23 @@ class TestBasic:
         with mock.patch.dict("os.environ", values=env_vars, clear=True):
             assert dfh.api.make_httpclient()[1] is True
 
+    async def test_validation_error_handler(self):
+        """Must log and return errors from custom validators."""
+        # Create a validation error whose context contains an exception, as
+        # is the case for errors from our custom Pydantic validators.
+        with pytest.raises(pydantic.ValidationError) as err:
+            UAMUser.model_validate(dict(make_user().model_dump(), name=" foo"))
+        exc = RequestValidationError(err.value.errors(), body={"name": " foo"})
+
+        with mock.patch.object(dfh.api.logit, "debug") as m_log:
+            resp = await dfh.api.validation_error_handler(mock.MagicMock(), exc)
+        assert resp.status_code == 422
+
+        # Log payload must be JSON serialisable and identical to the response.
+        content = m_log.call_args.args[1]
+        assert json.loads(json.dumps(content)) == json.loads(bytes(resp.body))
+        assert content["body"] == {"name": " foo"}
+
 
 class TestConfiguration:
     def test_compile_server_config_ok(self, tmp_path: Path):
@@ -150,6 +185,21 @@ class TestConfiguration:
             _, err = dfh.api.compile_server_config()
             assert err
 
+        # Must not create a client if the environment variables are invalid.
+        with mock.patch.object(dfh.api, "make_httpclient") as m_client:
+            with mock.patch.dict("os.environ", values={}, clear=True):
+                _, err = dfh.api.compile_server_config()
+                assert err
+            assert not m_client.called
+
+        # Must abort if we could not create the HTTP client.
+        new_env = {"DFH_MANAGED_BY": "foo", "DFH_ENV_LABEL": "bar"}
+        with mock.patch.object(dfh.api, "make_httpclient") as m_client:
+            m_client.return_value = (None, True)
+            with mock.patch.dict("os.environ", values=new_env, clear=True):
+                cfg, err = dfh.api.compile_server_config()
+                assert err and cfg.httpclient is None
+
     @mock.patch.object(dfh.api, "fetch_secrets")
     def test_make_app(self, m_secrets):
         m_secrets.return_value = ("sess", "api", False)
@@ -160,18 +210,59 @@ class TestConfiguration:
         assert set(extra) == {
             "session-key",
             "api-token-key",
+            "api-token-signer",
+            "api-token-cache",
             "config",
             "db",
             "spanner",
         }
         assert extra["api-token-key"] == "api"
+        assert extra["api-token-signer"].secret_keys == [b"api"]
+        assert extra["api-token-cache"] == {}
         assert extra["session-key"] == "sess"
 
+        # Must use the server configuration if we provide one.
+        cfg, err = dfh.api.compile_server_config()
+        assert not err
+        with mock.patch.object(dfh.api, "compile_server_config") as m_cfg:
+            app = dfh.api.make_app(cfg)
+            assert not m_cfg.called
+        assert app.extra["config"] is cfg  # type: ignore
+
         # Expect hard abort if we could not get the secrets.
         m_secrets.return_value = ("", "", True)
         with pytest.raises(RuntimeError):
             dfh.api.make_app()
 
+    def test_lifespan(self):
+        k8scfg = K8sConfig(client=httpx.AsyncClient())
+        started = []
+
+        async def fake_watch(cfg, k8scfg_, db, res):
+            # All watchers must share the same K8s client.
+            assert k8scfg_ is k8scfg
+            started.append(res.kind)
+            if res.kind == "Pod":
+                raise ValueError("some error")
+            await asyncio.sleep(3600)
+
+        app = dfh.api.make_app()
+        db = app.extra["db"]  # type: ignore
+
+        # Must start a watcher for every resource and stop all of them on
+        # shutdown, even if some of them have crashed.
+        with (
+            mock.patch.object(dfh.api.dfh.watch, "setup_k8s_watch", fake_watch),
+            mock.patch.object(
+                dfh.api.dfh.watch, "create_cluster_config"
+            ) as m_cluster_config,
+        ):
+            m_cluster_config.return_value = (k8scfg, False)
+            with TestClient(app):
+                pass
+            m_cluster_config.assert_called_once()
+        assert sorted(started) == sorted(_.kind for _ in db.resources.values())
+
 
 class TestBasicEndpoints:
     def test_get_root(self, client):
@@ -180,6 +271,7 @@ class TestBasicEndpoints:
             response = client.get(path)
             assert response.status_code == 200
             assert response.text == "Placeholder static/index.html"
+            assert response.headers["content-type"].startswith("text/html")
 
         # Assets are also used by static web apps.
         response = client.get("/demo/assets/index.html")
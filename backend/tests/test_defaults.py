@@ -7,14 +7,19 @@ class TestDefaults:
     def test_pod_fieldref_envs(self):
         out = dfh.defaults.pod_fieldref_envs()
 
-        names = [_.name for _ in out]
+        names = [_["name"] for _ in out]
         assert len(names) == 5
         assert set(names) == set(dfh.defaults.RESERVED_FIELDREF_ENVS)
+        assert set(names) == dfh.defaults.RESERVED_FIELDREF_ENVS_SET
+
+        # Must return the cached result on subsequent calls.
+        assert dfh.defaults.pod_fieldref_envs() is out
 
     def test_security_context(self):
         # Nothing much to test here so we just verify that it executes.
         ctx = dfh.defaults.pod_security_context()
         assert isinstance(ctx, dict)
+        assert dfh.defaults.pod_security_context() is ctx
 
     def test_topology_spread(self):
         ts = dfh.defaults.topology_spread({"app": "foo"})
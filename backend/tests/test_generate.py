@@ -1,5 +1,8 @@
+import asyncio
+import copy
 from pathlib import Path
 from typing import Dict
+from unittest import mock
 
 import pytest
 
@@ -17,12 +20,14 @@ from dfh.models import (
     DatabaseAppEntry,
     DeploymentInfo,
     K8sDatabase,
+    K8sDestinationRule,
     K8sEnvVar,
     K8sProbe,
     K8sProbeHttp,
     K8sRequestLimit,
     K8sResourceCpuMem,
     K8sService,
+    K8sVirtualService,
     WatchedResource,
 )
 
@@ -62,6 +67,31 @@ class TestBasic:
             "app.kubernetes.io/managed-by": cfg.managed_by,
         }
 
+    def test_clone_manifest(self):
+        manifest: dict = {"a": {"b": [1, {"c": None}], "d": "e"}, "f": 1.5, "g": True}
+        out = gen._clone_manifest(manifest)
+        assert out == manifest
+
+        # Clone must not share any mutable containers with the original.
+        assert out is not manifest
+        assert out["a"] is not manifest["a"]
+        assert out["a"]["b"][1] is not manifest["a"]["b"][1]
+
+    def test_load_deployment_template(self):
+        # Must parse the template only once and return the same object.
+        template = gen._load_deployment_template()
+        assert template is gen._load_deployment_template()
+        assert template["kind"] == "Deployment"
+
+        # Generating manifests must not modify the cached template.
+        expected = copy.deepcopy(template)
+        app_info = AppInfo(
+            metadata=AppMetadata(name="demo", env="stg", namespace="default"),
+        )
+        gen.deployment_manifest(cfg, app_info, False, base=None)
+        gen.deployment_manifest(cfg, app_info, True, base=None)
+        assert gen._load_deployment_template() == expected
+
     def test_info_from_manifests_empty(self):
         out_info, err = gen.appinfo_from_manifests(
             cfg,
@@ -113,6 +143,15 @@ class TestBasic:
         _, err = gen.appinfo_from_manifests(cfg, {"Deployment": res})
         assert err
 
+        # Must reject manifests that belong to different apps.
+        other = app_info.model_copy(deep=True)
+        other.metadata.name = "other"
+        res.manifests.clear()
+        res.manifests["one"] = gen.deployment_manifest(cfg, app_info, False, None)
+        res.manifests["two"] = gen.deployment_manifest(cfg, other, False, None)
+        _, err = gen.appinfo_from_manifests(cfg, {"Deployment": res})
+        assert err
+
     def test_info_from_manifests_invalid_labels(self):
         """Test function must abort if the manifests lack the essential labels.
 
@@ -227,10 +266,7 @@ class TestBasic:
                 name="fieldref",
                 valueFrom={"fieldRef": {"apiVersion": "v1", "fieldPath": "blah"}},
             ),
-        ] + [
-            _.model_dump(exclude_defaults=True)
-            for _ in dfh.defaults.pod_fieldref_envs()
-        ]
+        ] + list(dfh.defaults.pod_fieldref_envs())
 
         assert container["securityContext"] == dfh.defaults.pod_security_context()
 
@@ -258,6 +294,23 @@ class TestBasic:
         # Resources field must be an empty dict.
         assert obj["spec"]["template"]["spec"]["containers"][0]["resources"] == {}
 
+    def test_generate_deployment_nested_inplace_updates(self):
+        """Must retain nested `AppInfo` fields that were modified in place."""
+        ns, name, env = "default", "fooapp", "stg"
+        app_info = AppInfo(
+            metadata=AppMetadata(name=name, env=env, namespace=ns),
+        )
+        dply = app_info.primary.deployment
+        dply.useReadinessProbe = True
+        dply.readinessProbe.httpGet.path = "/ready"
+        dply.useResources = True
+        dply.resources.requests.cpu = "100m"
+
+        obj = gen.deployment_manifest(cfg, app_info, canary=False, base=None)
+        container = obj["spec"]["template"]["spec"]["containers"][0]
+        assert container["readinessProbe"]["httpGet"]["path"] == "/ready"
+        assert container["resources"]["requests"]["cpu"] == "100m"
+
     def test_generate_deployment_new_disabled_cpumem(self):
         ns, name, env = "default", "fooapp", "stg"
         app_info = AppInfo(
@@ -460,6 +513,7 @@ class TestBasic:
         assert is_dfh_manifest(cfg, manifests[res_name])
 
         primary_svc = K8sService.model_validate(manifests[res_name])
+        assert primary_svc.model_dump() == manifests[res_name]
         assert primary_svc.metadata.name == name
         assert primary_svc.metadata.namespace == ns
         assert len(primary_svc.spec.ports) == 1
@@ -565,6 +619,8 @@ class TestBasic:
         # Must have produced one `VirtualService` and one `DestinationRule` manifest.
         assert vs["kind"] == "VirtualService"
         assert dr["kind"] == "DestinationRule"
+        assert K8sVirtualService.model_validate(vs).model_dump() == vs
+        assert K8sDestinationRule.model_validate(dr).model_dump() == dr
         assert vs["apiVersion"] == dr["apiVersion"] == "networking.istio.io/v1beta1"
 
         assert vs["metadata"]["name"] == meta.name
@@ -872,6 +928,31 @@ class TestBasic:
         assert sq_cfg.kubeconfig == Path("/foo/bar.yaml")
         assert sq_cfg.kubecontext == "blah"
 
+    async def test_compile_plan_cancel_client_on_error(self):
+        """Must cancel the background K8s client setup if compilation fails."""
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def slow_cluster_config(*args, **kwargs):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        app_info = AppInfo(metadata=AppMetadata(name="foo", env="stg", namespace="ns"))
+        with (
+            mock.patch.object(gen.square.k8s, "cluster_config", slow_cluster_config),
+            mock.patch.object(gen, "manifests_from_appinfo") as m_manifests,
+        ):
+            m_manifests.return_value = (None, True)
+            with pytest.raises(AssertionError):
+                await gen.compile_plan(cfg, app_info, K8sDatabase())
+
+        # The background task must have been cancelled.
+        await asyncio.sleep(0)
+        assert started.is_set() and cancelled.is_set()
+
 
 class TestGenerateIntegration:
     async def test_compile_plan(self):
@@ -165,3 +165,16 @@ class TestK8sUtilities:
     def test_parse_pod_info_invalid(self):
         _, err = dfh.k8s.parse_pod_info({})
         assert err
+
+    def test_parse_pod_infos(self):
+        manifests = []
+        for name in ("b", "c", "a"):
+            manifest = yaml.safe_load(Path("tests/support/pod.yaml").read_text())
+            manifest["metadata"]["name"] = name
+            manifest["metadata"]["namespace"] = "default"
+            manifests.append(manifest)
+
+        # Must return the infos sorted by ID and skip invalid manifests.
+        infos = dfh.k8s.parse_pod_infos(manifests + [{}])
+        assert [_.id for _ in infos] == ["default/a", "default/b", "default/c"]
+        assert dfh.k8s.parse_pod_infos([]) == []
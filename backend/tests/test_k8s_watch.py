@@ -668,6 +668,12 @@ class TestResourceTracking:
             assert key in res.manifests
             assert res.manifests[key] == manifest
 
+        # Must strip the `managedFields` before storing the manifest.
+        manifest["metadata"]["managedFields"] = [{"manager": "kubectl"}]
+        data = {"type": "MODIFIED", "object": manifest}
+        assert not dfh.watch.track_resource(cfg, db, res, data)
+        assert "managedFields" not in res.manifests[key]["metadata"]
+
         for version in range(3):
             manifest["metadata"]["labels"]["version"] = str(version)
             data = {"type": "MODIFIED", "object": manifest}
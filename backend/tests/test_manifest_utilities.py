@@ -1,4 +1,5 @@
-from dfh.manifest_utilities import is_dfh_manifest
+from dfh.manifest_utilities import get_metainfo, is_dfh_manifest
+from dfh.models import AppMetadata
 
 from .conftest import get_server_config
 
@@ -47,3 +48,29 @@ class TestBasic:
             }
         }
         assert is_dfh_manifest(cfg, manifest)
+
+    def test_get_metainfo(self):
+        labels = {
+            cfg.env_label: "stg",
+            "app.kubernetes.io/name": "name",
+            "app.kubernetes.io/managed-by": cfg.managed_by,
+        }
+
+        # Valid.
+        manifest = {"metadata": {"namespace": "ns", "labels": labels}}
+        meta, err = get_metainfo(cfg, manifest)
+        assert not err
+        assert meta == AppMetadata(name="name", env="stg", namespace="ns")
+
+        # The namespace is optional, eg for cluster wide resources.
+        meta, err = get_metainfo(cfg, {"metadata": {"labels": labels}})
+        assert not err
+        assert meta == AppMetadata(name="name", env="stg", namespace="")
+
+        # Must reject manifests that DFH does not manage.
+        for name in labels:
+            invalid = dict(labels)
+            invalid[name] = ""
+            _, err = get_metainfo(cfg, {"metadata": {"labels": invalid}})
+            assert err
+        assert get_metainfo(cfg, {}) == (AppMetadata(), True)
@@ -61,6 +61,12 @@ class TestModels:
         for name, res in resources.items():
             assert res.kind == name
 
+        # Every call must return independent copies.
+        resources["Pod"].manifests["foo"] = {}
+        other = dfh.models.factory_WatchedResource()
+        assert other["Pod"] is not resources["Pod"]
+        assert other["Pod"].manifests == {}
+
     def test_virtualservice(self):
         raw = yaml.safe_load(
             Path("tests/support/virtualservice-specimen.yaml").read_text()
@@ -139,7 +145,7 @@ class TestModels:
                 UAMUser.model_validate(src)
 
         # Must reject malformed strings for name, lanid and Slack.
-        invalid_strings = ["", "  ", " foo"]
+        invalid_strings = ["", "  ", " foo", "foo "]
         for key in ("name", "lanid", "slack"):
             for value in invalid_strings:
                 with pytest.raises(pydantic.ValidationError):
@@ -153,7 +159,7 @@ class TestModels:
         group = UAMGroup(name="name", owner="owner", provider="github")
 
         # Must reject malformed strings for name and owner.
-        invalid_strings = ["", "  ", " foo"]
+        invalid_strings = ["", "  ", " foo", "foo "]
         for key in ("name", "owner"):
             for value in invalid_strings:
                 with pytest.raises(pydantic.ValidationError):
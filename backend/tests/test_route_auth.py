@@ -75,6 +75,9 @@ class TestGoogleAuthentication:
             m_get.return_value = httpx.Response(200, json={"email": email})
             resp = client.post("/validate-google-bearer-token", json=data)
             assert resp.status_code == 200
+            m_get.assert_called_once_with(
+                auth.GOOGLE_USERINFO_URL, params={"access_token": "invalid-token"}
+            )
             sess = get_session_cookie(resp)
             assert sess is not None and sess["email"] == email
 
@@ -198,12 +201,13 @@ class TestAPIAuthentication:
         url = "/users/me"
         _, api_key, err = dfh.api.fetch_secrets()
         assert not err
+        signer = itsdangerous.TimestampSigner(api_key)
 
         # No session or bearer token.
         assert client.get(url).status_code == 401
 
         # Use a valid bearer token.
-        token = auth.mint_token("foo@bar.com", api_key).token
+        token = auth.mint_token("foo@bar.com", signer).token
         headers = {"Authorization": f"Bearer {token}"}
         assert client.get(url, headers=headers).status_code == 200
 
@@ -226,15 +230,52 @@ class TestAPIAuthentication:
         url = "/users/me"
         _, api_key, err = dfh.api.fetch_secrets()
         assert not err
+        signer = itsdangerous.TimestampSigner(api_key)
 
         relative_time = datetime.now(timezone.utc) - timedelta(seconds=3595)
         with freeze_time(relative_time):
-            token = auth.mint_token("foo@bar.com", api_key).token
+            token = auth.mint_token("foo@bar.com", signer).token
             headers = {"Authorization": f"Bearer {token}"}
         assert client.get(url, headers=headers).status_code == 200
 
         relative_time = datetime.now(timezone.utc) - timedelta(seconds=3605)
         with freeze_time(relative_time):
-            token = auth.mint_token("foo@bar.com", api_key).token
+            token = auth.mint_token("foo@bar.com", signer).token
             headers = {"Authorization": f"Bearer {token}"}
         assert client.get(url, headers=headers).status_code == 401
+
+    def test_is_authenticated_token_cache(self, client: TestClient):
+        """Cached tokens must still expire."""
+        url = "/users/me"
+        _, api_key, err = dfh.api.fetch_secrets()
+        assert not err
+        signer = itsdangerous.TimestampSigner(api_key)
+        cache = client.app.extra["api-token-cache"]  # type: ignore
+
+        # Mint a token that expires in 5s. Using it must add it to the cache.
+        now = datetime.now(timezone.utc)
+        with freeze_time(now - timedelta(seconds=3595)):
+            token = auth.mint_token("foo@bar.com", signer).token
+        headers = {"Authorization": f"Bearer {token}"}
+        with freeze_time(now):
+            assert client.get(url, headers=headers).status_code == 200
+            assert cache[token][0] == "foo@bar.com"
+
+            # Must still accept the token when it is served from the cache.
+            assert client.get(url, headers=headers).status_code == 200
+
+        # Must reject the cached token once it has expired.
+        with freeze_time(now + timedelta(seconds=10)):
+            assert client.get(url, headers=headers).status_code == 401
+
+        # Must not cache invalid tokens.
+        headers = {"Authorization": f"Bearer {token[:-1]}"}
+        assert client.get(url, headers=headers).status_code == 401
+        assert token[:-1] not in cache
+
+        # Must flush the cache once it is full.
+        token = auth.mint_token("foo@bar.com", signer).token
+        headers = {"Authorization": f"Bearer {token}"}
+        with mock.patch.object(deps, "API_TOKEN_CACHE_SIZE", 1):
+            assert client.get(url, headers=headers).status_code == 200
+            assert set(cache) == {token}
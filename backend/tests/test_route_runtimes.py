@@ -357,7 +357,7 @@ class TestRuntimes:
         plan = square.dtypes.DeploymentPlan(create=[], patch=[], delete=[])
 
         # Queue a fake job.
-        await runtimes.queue_job(client.app, job.jobId, plan)
+        runtimes.queue_job(client.app, job.jobId, plan)
 
         # Must return 200 because the job exists.
         ret = client.post("/v1/jobs", json=job.model_dump())
@@ -369,7 +369,7 @@ class TestRuntimes:
         assert ret.status_code == 412
 
         # Must return 418 because the job failed.
-        await runtimes.queue_job(client.app, job.jobId, plan)
+        runtimes.queue_job(client.app, job.jobId, plan)
         m_plan.return_value = True
         job = JobDescription(jobId="jobid")
         ret = client.post("/v1/jobs", json=job.model_dump())
@@ -457,10 +457,7 @@ class TestIntegration:
             )
             assert not err
             env_vars = resp["spec"]["template"]["spec"]["containers"][0]["env"]
-            default_envs = [
-                _.model_dump(exclude_defaults=True)
-                for _ in dfh.defaults.pod_fieldref_envs()
-            ]
+            default_envs = list(dfh.defaults.pod_fieldref_envs())
             assert env_vars == [{"name": "create", "value": "app"}] + default_envs
 
             # Service.
@@ -583,10 +580,7 @@ class TestIntegration:
             assert not err
 
             env_vars = resp["spec"]["template"]["spec"]["containers"][0]["env"]
-            default_envs = [
-                _.model_dump(exclude_defaults=True)
-                for _ in dfh.defaults.pod_fieldref_envs()
-            ]
+            default_envs = list(dfh.defaults.pod_fieldref_envs())
             assert env_vars == [{"name": "foo", "value": "bar"}] + default_envs
 
 